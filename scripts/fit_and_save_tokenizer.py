@@ -1,4 +1,5 @@
 import argparse
+import os
 
 from chess_model.model import ChessTokenizer
 
@@ -25,7 +26,28 @@ def main():
         default=DEFAULT_TOKENIZER_OUTPUT_FILE,
     )
 
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Refit the tokenizer even if the output file is already up to date with the training data.",
+    )
+
     args = parser.parse_args()
+
+    # Fitting walks the entire training CSV; skip it when the saved tokenizer
+    # is already newer than the data it would be fit on
+    if (
+        not args.force
+        and os.path.exists(args.output_tokenizer_file)
+        and os.path.getmtime(args.output_tokenizer_file)
+        >= os.path.getmtime(args.input_training_data_file)
+    ):
+        print(
+            f"Tokenizer at {args.output_tokenizer_file} is up to date with "
+            f"{args.input_training_data_file}; skipping fit. Use --force to refit."
+        )
+        return
+
     print("Fitting tokenizer...")
     tokenizer = ChessTokenizer.fit(args.input_training_data_file)
     print(f"Tokenizer initialized with vocab_size={tokenizer.vocab_size}")
@@ -1,3 +1,3 @@
-from .dataset import ChessDataset
+from .dataset import ChessDataset, chess_collate
 
-__all__ = ["ChessDataset"]
+__all__ = ["ChessDataset", "chess_collate"]
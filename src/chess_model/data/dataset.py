@@ -1,10 +1,114 @@
 import csv
-import mmap
+import os
 
 import torch
+import torch.distributed as dist
 from torch.utils.data import Dataset
 from tqdm import tqdm
 
+# Materialized tensors are cached next to the source CSV under this suffix
+CACHE_SUFFIX = ".tokens.pt"
+
+
+def materialize_dataset(csv_file, tokenizer, max_context_length):
+    """
+    Tokenizes every example in the CSV file once, producing a dict of flat
+    tensors stacked across examples (structure-of-arrays layout). The result
+    is what `ChessDataset` saves to its cache file.
+    """
+    # Token ids easily fit in 16 bits (chess SAN vocabularies are a few
+    # thousand moves), so store them as int16 for a 4x smaller cache file
+    # and memory footprint; __getitem__ casts back to long for the embedding
+    # lookup.
+    if tokenizer.vocab_size >= 2**15:
+        raise ValueError(
+            f"Tokenizer vocab_size {tokenizer.vocab_size} does not fit in int16 storage"
+        )
+
+    all_input_ids = []
+    all_labels = []
+    all_is_checkmate = []
+    all_outcomes = []
+    all_move_masks = []
+
+    with open(csv_file, "r", newline="") as f:
+        reader = csv.reader(f)
+        next(reader)  # Skip the header row
+
+        for row in tqdm(reader, desc="Tokenizing dataset"):
+            context, is_checkmate, outcome = row
+
+            context = context.split() if context else []
+            context, last_move = context[:-1], context[-1]
+
+            input_ids = tokenizer.encode_and_pad(context, max_context_length)
+
+            # Shift context to the left to create labels
+            # The next move prediction for input_ids[n] is labels[n]
+            labels = context[1:] + [last_move]
+            labels = tokenizer.encode_and_pad(labels, max_context_length)
+
+            # If white won, we want the model to learn from white's moves, not
+            # black's. Conversely, if black won, we want the model to learn
+            # from black's moves. For draws, we want the model to learn from
+            # both moves. We will produce a mask that masks out the moves for
+            # the losing player, and the model will learn from the remaining
+            # moves.
+            move_mask = torch.ones(max_context_length, dtype=torch.float)
+
+            if outcome == "1-0":  # White won
+                # Mask out odd-indexed moves (Black's moves)
+                move_mask[1::2] = 0
+            elif outcome == "0-1":  # Black won
+                # Mask out even-indexed moves (White's moves)
+                move_mask[::2] = 0
+            # For draws (1/2-1/2), keep all moves (mask stays 1)
+
+            # If the context is shorter than max_context_length, zero-out that
+            # part of the mask
+            if len(context) < max_context_length:
+                move_mask[len(context) :] = 0
+
+            # Convert outcome to one-hot encoding (as float)
+            outcome_label = torch.zeros(3, dtype=torch.float)
+            if outcome == "1-0":
+                outcome_label[0] = 1.0
+            elif outcome == "0-1":
+                outcome_label[1] = 1.0
+            elif outcome == "1/2-1/2":
+                outcome_label[2] = 1.0
+
+            all_input_ids.append(input_ids)
+            all_labels.append(labels)
+            all_is_checkmate.append(float(is_checkmate))
+            all_outcomes.append(outcome_label)
+            all_move_masks.append(move_mask)
+
+    return {
+        "max_context_length": max_context_length,
+        "input_ids": torch.tensor(all_input_ids, dtype=torch.int16),
+        "labels": torch.tensor(all_labels, dtype=torch.int16),
+        "is_checkmate": torch.tensor(all_is_checkmate, dtype=torch.float),
+        "outcome": torch.stack(all_outcomes),
+        "move_mask": torch.stack(all_move_masks),
+    }
+
+
+def chess_collate(samples):
+    """
+    Collates a list of `ChessDataset` items into a batch dict. Each field is
+    written into one preallocated contiguous tensor, instead of the default
+    collate's per-field dispatch and intermediate stack, so the batch is a
+    handful of allocations rather than one per sample per field.
+    """
+    batch = {}
+    for key, first in samples[0].items():
+        out = torch.empty((len(samples), *first.shape), dtype=first.dtype)
+        for i, sample in enumerate(samples):
+            out[i] = sample[key]
+        batch[key] = out
+    return batch
+
 
 class ChessDataset(Dataset):
     """
@@ -20,97 +124,57 @@ class ChessDataset(Dataset):
     indicating if the game is a checkmate, and an outcome (1-0, 0-1, or
     1/2-1/2).
 
-    The implementation does not load all data into memory at once, but rather
-    caches the line offsets of the CSV file. This allows for efficient random
-    access to the data while minimizing memory usage.
+    On first use the whole file is tokenized into flat tensors and cached in
+    a `.tokens.pt` file next to the CSV; subsequent runs memory-map that
+    cache instead of re-parsing and re-tokenizing per sample. The mmap also
+    lets DataLoader workers share the tensors through the OS page cache
+    rather than each holding a copy.
     """
 
     def __init__(self, csv_file, tokenizer, max_context_length=50):
         self.csv_file = csv_file
-        self.tokenizer = tokenizer
-        self.max_context_length = max_context_length
-        self.line_offsets = []
-        self.file = open(self.csv_file, "r")
-
-        # Create an index of line offsets for random access
-        with open(self.csv_file, "rb") as f:
-            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-            total_size = mm.size()
-            self.line_offsets.append(0)
-
-            with tqdm(
-                total=total_size, unit="B", unit_scale=True, desc="Indexing CSV file"
-            ) as pbar:
-                while mm.readline():
-                    current_pos = mm.tell()
-                    self.line_offsets.append(current_pos)
-                    pbar.update(current_pos - pbar.n)
-
-            mm.close()
-
-        # Remove the last offset (empty line at the end of file)
-        self.line_offsets.pop()
+        cache_file = str(csv_file) + CACHE_SUFFIX
+
+        cache = None
+        if os.path.exists(cache_file) and os.path.getmtime(
+            cache_file
+        ) >= os.path.getmtime(csv_file):
+            cache = torch.load(cache_file, mmap=True)
+            if cache.get("max_context_length") != max_context_length:
+                # Cached with different settings; re-materialize
+                cache = None
+
+        if cache is None:
+            # Under torchrun, only rank 0 materializes; the other ranks wait
+            # at the barrier and then read the finished cache, rather than
+            # all ranks tokenizing and racing to write the same path.
+            is_distributed = dist.is_available() and dist.is_initialized()
+            if not is_distributed or dist.get_rank() == 0:
+                cache = materialize_dataset(csv_file, tokenizer, max_context_length)
+                # Write to a temp file and rename it into place so no reader
+                # ever observes a half-written cache
+                tmp_file = f"{cache_file}.tmp.{os.getpid()}"
+                torch.save(cache, tmp_file)
+                os.replace(tmp_file, cache_file)
+            if is_distributed:
+                dist.barrier()
+            # Reload through mmap so the tensors are backed by the file
+            cache = torch.load(cache_file, mmap=True)
+
+        self.input_ids = cache["input_ids"]
+        self.labels = cache["labels"]
+        self.is_checkmate = cache["is_checkmate"]
+        self.outcome = cache["outcome"]
+        self.move_mask = cache["move_mask"]
 
     def __len__(self):
-        return len(self.line_offsets) - 1  # Subtract 1 to account for header
+        return self.input_ids.size(0)
 
     def __getitem__(self, idx):
-        # Add 1 to idx to skip the header
-        self.file.seek(self.line_offsets[idx + 1])
-        line = self.file.readline().strip()
-
-        # Parse the CSV line
-        row = next(csv.reader([line]))
-        context, is_checkmate, outcome = row
-
-        context = context.split() if context else []
-        context, last_move = context[:-1], context[-1]
-        is_checkmate = float(is_checkmate)
-
-        input_ids = self.tokenizer.encode_and_pad(context, self.max_context_length)
-
-        # Shift context to the left to create labels
-        # The next move prediction for input_ids[n] is labels[n]
-        labels = context[1:] + [last_move]
-        labels = self.tokenizer.encode_and_pad(labels, self.max_context_length)
-
-        # If white won, we want the model to learn from white's moves, not black's.
-        # Conversely, if black won, we want the model to learn from black's moves.
-        # For draws, we want the model to learn from both moves.
-        # We will produce a mask that masks out the moves for the losing player,
-        # and the model will learn from the remaining moves.
-        move_mask = torch.ones(self.max_context_length, dtype=torch.float)
-
-        if outcome == "1-0":  # White won
-            # Mask out odd-indexed moves (Black's moves)
-            move_mask[1::2] = 0
-        elif outcome == "0-1":  # Black won
-            # Mask out even-indexed moves (White's moves)
-            move_mask[::2] = 0
-        # For draws (1/2-1/2), keep all moves (mask stays 1)
-
-        # If the context is shorter than max_context_length, zero-out that part of the mask
-        if len(context) < self.max_context_length:
-            move_mask[len(context) :] = 0
-
-        # Convert outcome to one-hot encoding (as float)
-        outcome_label = torch.zeros(3, dtype=torch.float)
-        if outcome == "1-0":
-            outcome_label[0] = 1.0
-        elif outcome == "0-1":
-            outcome_label[1] = 1.0
-        elif outcome == "1/2-1/2":
-            outcome_label[2] = 1.0
-
         return {
-            "input_ids": torch.tensor(input_ids, dtype=torch.long),
-            "labels": torch.tensor(labels, dtype=torch.long),
-            "is_checkmate": torch.tensor(is_checkmate, dtype=torch.float),
-            "outcome": outcome_label,
-            "move_mask": move_mask,
+            "input_ids": self.input_ids[idx].to(torch.long),
+            "labels": self.labels[idx].to(torch.long),
+            "is_checkmate": self.is_checkmate[idx],
+            "outcome": self.outcome[idx],
+            "move_mask": self.move_mask[idx],
         }
-
-    def __del__(self):
-        # Close the file when the dataset object is destroyed
-        if hasattr(self, "file"):
-            self.file.close()
@@ -1,3 +1,4 @@
+from .prefetcher import ChessPrefetcher
 from .training import train_model
 
-__all__ = ["train_model"]
+__all__ = ["ChessPrefetcher", "train_model"]
@@ -0,0 +1,56 @@
+import torch
+
+
+class ChessPrefetcher:
+    """
+    Wraps a DataLoader on CUDA devices so that each batch's host->device copy
+    runs on a dedicated CUDA stream while the previous batch is still being
+    processed. This hides the PCIe transfer latency behind compute instead of
+    paying it between every step.
+
+    Requires the wrapped DataLoader to use `pin_memory=True` for the copies
+    to be truly asynchronous.
+    """
+
+    def __init__(self, dataloader, device):
+        self.dataloader = dataloader
+        self.device = device
+        self.stream = torch.cuda.Stream()
+        self.iterator = None
+        self.next_batch = None
+
+    def __len__(self):
+        return len(self.dataloader)
+
+    def __iter__(self):
+        self.iterator = iter(self.dataloader)
+        self._preload()
+        return self
+
+    def __next__(self):
+        if self.next_batch is None:
+            raise StopIteration
+
+        # Make sure the copy stream has finished before the compute stream
+        # touches the batch, and tell the allocator the tensors are now in
+        # use on the compute stream so their memory isn't reused too early.
+        torch.cuda.current_stream().wait_stream(self.stream)
+        batch = self.next_batch
+        for tensor in batch.values():
+            tensor.record_stream(torch.cuda.current_stream())
+
+        self._preload()
+        return batch
+
+    def _preload(self):
+        try:
+            batch = next(self.iterator)
+        except StopIteration:
+            self.next_batch = None
+            return
+
+        with torch.cuda.stream(self.stream):
+            self.next_batch = {
+                key: tensor.to(self.device, non_blocking=True)
+                for key, tensor in batch.items()
+            }
@@ -1,20 +1,71 @@
-import csv
-import random
+import itertools
+import os
+import zlib
+from functools import partial
+from multiprocessing import Pool
 
 from tqdm import tqdm
 
-from .count_lines import count_lines_fast
+# How many game lines each worker processes per task
+CHUNK_SIZE = 10_000
+
+# Size of the output file buffers (1 MiB)
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+CSV_HEADER = "context,is_checkmate,outcome\n"
 
 
 def process_game(game, max_context_length):
-    game = game.split()
-    moves = game[:-1]  # Remove the outcome from the move list
-    outcome = game[-1]
-    context = " ".join(moves[:max_context_length])
-    is_checkmate = "1" if context[-1].endswith("#") else "0"
+    moves = game.split()
+    outcome = moves.pop()  # The outcome is the last token of the line
+    del moves[max_context_length:]  # Truncate in place rather than slice-copying
+    context = " ".join(moves)
+    # Slice compare instead of str.endswith: cheaper in CPython, and safe on
+    # an empty context (indexing context[-1] would raise)
+    is_checkmate = "1" if context[-1:] == "#" else "0"
     yield context, is_checkmate, outcome
 
 
+def _process_chunk(lines, max_context_length, val_threshold):
+    """
+    Worker task: turn a chunk of game lines into formatted CSV rows, routed
+    to the train or validation split. Returns the two row lists plus the
+    number of input bytes consumed (for the caller's progress bar).
+
+    SAN move text and outcome tokens never contain commas or quotes, so rows
+    are formatted directly instead of going through csv.writer; the comma
+    check guards that invariant.
+    """
+    train_rows = []
+    val_rows = []
+    n_bytes = 0
+
+    for line in lines:
+        n_bytes += len(line)
+        game = line.strip()
+        if "," in game:
+            raise ValueError(f"Unexpected comma in game line: {game!r}")
+
+        # Route each game to a split by hashing the game text rather than
+        # drawing a random number per row. This is deterministic across runs
+        # (CRC32, unlike str hash, is unsalted), keeps all rows from a game
+        # in the same split, and avoids an RNG state update per example.
+        is_val = (zlib.crc32(game.encode()) & 0xFFFF) < val_threshold
+        rows = val_rows if is_val else train_rows
+        for context, is_checkmate, outcome in process_game(game, max_context_length):
+            rows.append(f"{context},{is_checkmate},{outcome}\n")
+
+    return train_rows, val_rows, n_bytes
+
+
+def _read_chunks(infile, chunk_size):
+    while True:
+        chunk = list(itertools.islice(infile, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def prepare_training_data(
     input_reduced_pgn_file,
     output_training_data_file,
@@ -22,28 +73,36 @@ def prepare_training_data(
     max_context_length,
     validation_split,
 ):
-    with open(output_training_data_file, "w", newline="") as train_outfile, open(
-        output_validation_data_file, "w", newline=""
+    with open(
+        output_training_data_file, "w", buffering=OUTPUT_BUFFER_SIZE
+    ) as train_outfile, open(
+        output_validation_data_file, "w", buffering=OUTPUT_BUFFER_SIZE
     ) as val_outfile:
-        train_writer = csv.writer(train_outfile)
-        val_writer = csv.writer(val_outfile)
-
-        headers = ["context", "is_checkmate", "outcome"]
-        train_writer.writerow(headers)
-        val_writer.writerow(headers)
-
-        # Count total lines for progress bar
-        total_lines = count_lines_fast(input_reduced_pgn_file)
-
-        with open(input_reduced_pgn_file, "r") as infile:
-            for line in tqdm(infile, total=total_lines, desc="Processing games"):
-                game = line.strip()
-                for context, is_checkmate, outcome in process_game(
-                    game, max_context_length
-                ):
-                    # Decide whether to write to train or val file
-                    row = [context, is_checkmate, outcome]
-                    if random.random() < validation_split:
-                        val_writer.writerow(row)
-                    else:
-                        train_writer.writerow(row)
+        train_outfile.write(CSV_HEADER)
+        val_outfile.write(CSV_HEADER)
+
+        # Size the progress bar in bytes so we don't have to read the whole
+        # file once just to count its lines before reading it again
+        total_bytes = os.path.getsize(input_reduced_pgn_file)
+
+        val_threshold = int(validation_split * 65536)
+        worker = partial(
+            _process_chunk,
+            max_context_length=max_context_length,
+            val_threshold=val_threshold,
+        )
+
+        # The per-game string munging is pure CPU with no cross-game
+        # dependency, so farm chunks out to worker processes; the main
+        # process only routes the returned rows to the output files. The
+        # hash-based split keeps the output deterministic even though
+        # imap_unordered returns chunks out of order.
+        with open(input_reduced_pgn_file, "r") as infile, tqdm(
+            total=total_bytes, unit="B", unit_scale=True, desc="Processing games"
+        ) as pbar, Pool(processes=os.cpu_count()) as pool:
+            for train_rows, val_rows, n_bytes in pool.imap_unordered(
+                worker, _read_chunks(infile, CHUNK_SIZE)
+            ):
+                train_outfile.writelines(train_rows)
+                val_outfile.writelines(val_rows)
+                pbar.update(n_bytes)
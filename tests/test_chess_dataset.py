@@ -1,6 +1,9 @@
+import os
+
 import pytest
 
 from chess_model.data import ChessDataset
+from chess_model.data.dataset import CACHE_SUFFIX
 from chess_model.model import ChessTokenizer
 
 
@@ -71,3 +74,26 @@ def test_chess_dataset_getitem(chess_dataset):
     print(f"expected_move_mask: {expected_move_mask}")
     print(f"item['move_mask']: {item['move_mask'].tolist()}")
     assert item["move_mask"].tolist() == expected_move_mask
+
+
+def test_chess_dataset_cache_reuse(training_data_file, chess_tokenizer):
+    dataset = ChessDataset(
+        str(training_data_file), chess_tokenizer, max_context_length=10
+    )
+    cache_file = str(training_data_file) + CACHE_SUFFIX
+    assert os.path.exists(cache_file)
+
+    # A second dataset should load from the cache and produce identical items
+    cached_dataset = ChessDataset(
+        str(training_data_file), chess_tokenizer, max_context_length=10
+    )
+    assert len(cached_dataset) == len(dataset)
+    item, cached_item = dataset[0], cached_dataset[0]
+    for key in item:
+        assert item[key].tolist() == cached_item[key].tolist()
+
+    # A different max_context_length invalidates the cache
+    resized_dataset = ChessDataset(
+        str(training_data_file), chess_tokenizer, max_context_length=12
+    )
+    assert resized_dataset[0]["input_ids"].shape == (12,)